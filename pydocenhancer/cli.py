@@ -13,9 +13,13 @@ def cli():
 @click.option("--model", required=True, help="Model name (e.g., llama3.2, ollama/llama3.2:latest)")
 @click.option("--api-key", default=None, help="API key for cloud providers")
 @click.option("--language", default="en", help="Language code for documentation (e.g., en, fr, es, zh)")
-def enhance(module, output, provider, model, api_key, language):
+@click.option("--no-cache", is_flag=True, default=False, help="Query the LLM even for unchanged functions")
+@click.option("--local-workers", default=1, type=click.IntRange(min=1),
+              help="Worker processes for ctransformers models, each loading its own copy of the model")
+def enhance(module, output, provider, model, api_key, language, no_cache, local_workers):
     """Generate enhanced documentation for a Python module, with optional language translation and example testing."""
-    enhancer = DocEnhancer(provider=provider, model=model, api_key=api_key, language=language)
+    enhancer = DocEnhancer(provider=provider, model=model, api_key=api_key, language=language, cache=not no_cache,
+                           local_workers=local_workers)
     enhancer.generate_docs(module_path=module, output_dir=output, language=language)
     click.echo(f"Documentation generated in {output} (language: {language})")
 
@@ -24,10 +28,11 @@ def enhance(module, output, provider, model, api_key, language):
 @click.option("--docs-dir", default="docs", help="Directory with documentation")
 def search(query, docs_dir):
     """Search documentation with a natural language query."""
-    enhancer = DocEnhancer()
-    results = enhancer.search_docs(query, docs_dir)
+    results = DocEnhancer.search_docs(query, docs_dir)
     for result in results:
         click.echo(result)
+    if not results:
+        click.echo(f"No matches for '{query}' in {docs_dir}")
 
 def main():
     cli() 
\ No newline at end of file
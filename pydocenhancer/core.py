@@ -1,194 +1,906 @@
 import ast
-import inspect
-from typing import Dict, List, Optional
+import asyncio
+import glob
+import hashlib
+import mmap
+import re
+import sqlite3
+import subprocess
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import os
+import random
 import sys
-import io
+import time
 import contextlib
+import functools
+import aiohttp
+import orjson
 import requests
 
+OLLAMA_URL = "http://localhost:11434/api/generate"
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+JSON_HEADERS = {"Content-Type": "application/json"}
+# HTTP statuses worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Seconds every OpenAI request waits after the API reports a rate limit.
+RATE_LIMIT_COOLDOWN = 15
+# Seconds an Ollama request may go without receiving data. Ollama queues requests beyond its
+# parallel slots and sends nothing until generation finishes, so this bounds a stall, not a run.
+OLLAMA_READ_TIMEOUT = 300
+# Keys of the JSON object returned for the fused "multi" task.
+MULTI_KEYS = ("translation", "summary", "explanation", "example")
+# Prompt template per LLM task; unknown tasks send the text unchanged.
+_PROMPTS = {
+    "summarize": "Summarize the following Python code in {lang}:\n{text}",
+    "explain": "Explain what the following Python code does in {lang}:\n{text}",
+    "translate": "Translate the following documentation to {lang}:\n{text}",
+    "example": "Generate a usage example for the following Python function in {lang}:\n{text}",
+    "multi": (
+        "Return a JSON object with the keys translation, summary, explanation and example "
+        "for the following Python function. translation: its docstring translated to "
+        "{lang}; summary: a summary of the code in {lang}; explanation: what the code does, "
+        "in {lang}; example: a usage example.\n{text}"
+    ),
+}
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+# Everything after the first line mentioning "Example", up to a line opening a triple-quoted string.
+_EXAMPLE_RE = re.compile(r"Example[^\n]*\n(.*?)(?=^[^\S\n]*(?:\"\"\"|''')|\Z)", re.DOTALL | re.MULTILINE)
+# Example lines worth keeping: not blank (whitespace-only, as str.strip() sees it), not a doctest
+# prompt, not another "Example" header.
+_EXAMPLE_LINE_RE = re.compile(r"^(?![^\S\n]*(?:>>>|$))(?!.*Example).+$", re.MULTILINE)
+# Words of a search query; shorter ones ("a", "of") would match nearly every line.
+_QUERY_TOKEN_RE = re.compile(r"\w{3,}")
+# Seconds a docstring example may run before it is killed.
+EXAMPLE_TIMEOUT = 10
+# Number of functions written to the markdown file between explicit flushes.
+FLUSH_EVERY = 16
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pydocenhancer")
+# Shared so that synchronous requests reuse keep-alive connections.
+_HTTP_SESSION = requests.Session()
+# Number of parsed modules kept in _AST_CACHE; the least recently used is evicted first.
+AST_CACHE_SIZE = 32
+# Parsed modules keyed by absolute path: (st_mtime_ns, st_size, tree, source lines). Source lines
+# are only kept where ast.unparse is missing (Python 3.8) and sources are sliced from them instead.
+_AST_CACHE: "OrderedDict[str, Tuple[int, int, ast.Module, Optional[List[str]]]]" = OrderedDict()
+
+
+# FunctionBatch column for each key of a function's details dict.
+_BATCH_COLUMNS = (
+    ("names", "name"),
+    ("qualnames", "qualname"),
+    ("sources", "source"),
+    ("docstrings", "docstring"),
+    ("summaries", "summary"),
+    ("explanations", "explanation"),
+    ("examples", "example"),
+    ("example_test_results", "example_test_result"),
+)
+
+
+@dataclass
+class FunctionBatch:
+    """Details of a module's functions stored column-wise, one list per field, rather than one dict per function.
+
+    Indexing or iterating yields the familiar per-function dicts; slicing yields a smaller batch.
+    """
+    names: List[str] = field(default_factory=list)
+    qualnames: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    docstrings: List[str] = field(default_factory=list)
+    summaries: List[str] = field(default_factory=list)
+    explanations: List[str] = field(default_factory=list)
+    examples: List[str] = field(default_factory=list)
+    example_test_results: List[Optional[str]] = field(default_factory=list)
+
+    def append(self, func: Dict) -> None:
+        for column, key in _BATCH_COLUMNS:
+            getattr(self, column).append(func[key])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict, "FunctionBatch"]:
+        if isinstance(index, slice):
+            return FunctionBatch(**{column: getattr(self, column)[index] for column, _ in _BATCH_COLUMNS})
+        return {key: getattr(self, column)[index] for column, key in _BATCH_COLUMNS}
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class RateLimiter:
+    """Token bucket keeping requests under per-minute request and token budgets.
+
+    Follows openai-cookbook's api_request_parallel_processor.py: capacity refills continuously, each
+    request spends one request slot plus its estimated tokens, and a rate-limit response pauses everyone.
+    """
+
+    def __init__(self, max_requests_per_minute: float, max_tokens_per_minute: float):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_requests = max_requests_per_minute
+        self.available_tokens = max_tokens_per_minute
+        self.last_update = time.monotonic()
+        self.resume_at = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.available_requests = min(self.max_requests_per_minute,
+                                      self.available_requests + elapsed * self.max_requests_per_minute / 60)
+        self.available_tokens = min(self.max_tokens_per_minute,
+                                    self.available_tokens + elapsed * self.max_tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        # A single prompt larger than the whole budget would otherwise wait forever.
+        tokens = min(tokens, self.max_tokens_per_minute)
+        while True:
+            pause = self.resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            self._refill()
+            if self.available_requests >= 1 and self.available_tokens >= tokens:
+                self.available_requests -= 1
+                self.available_tokens -= tokens
+                return
+            await asyncio.sleep(max(
+                (1 - self.available_requests) * 60 / self.max_requests_per_minute,
+                (tokens - self.available_tokens) * 60 / self.max_tokens_per_minute,
+            ))
+
+    def pause(self, seconds: float) -> None:
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+class ResponseCache:
+    """SQLite-backed store of LLM responses keyed by model, task, language and input text."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, value TEXT NOT NULL)")
+
+    @staticmethod
+    def key(model: Optional[str], task: str, lang: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}|{task}|{lang}|{text}".encode("utf-8")).digest()
+
+    # A locked, corrupt or read-only cache must never fail a run: errors count as misses.
+    def get(self, key: bytes) -> Optional[str]:
+        try:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def set(self, key: bytes, value: str) -> None:
+        try:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+        except sqlite3.Error:
+            pass
+
+    def discard(self, key: bytes) -> None:
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+
+
+def _load_local_model(model: str, threads: Optional[int] = None):
+    try:
+        from ctransformers import AutoModelForCausalLM
+        if threads:
+            return AutoModelForCausalLM.from_pretrained(model, threads=threads)
+        return AutoModelForCausalLM.from_pretrained(model)
+    except ImportError:
+        raise ImportError("ctransformers is required for local LLMs. Install with 'pip install pydocenhancer[local]'.")
+
+
+# Model held by each local-LLM worker process, loaded once by _init_worker.
+_WORKER_MODEL = None
+
+
+def _init_worker(model: str, threads: int) -> None:
+    global _WORKER_MODEL
+    _WORKER_MODEL = _load_local_model(model, threads)
+
+
+def _worker_llm(prompt: str) -> str:
+    """Run a prompt on this worker's local model; top-level so it can be pickled."""
+    return _WORKER_MODEL(prompt)
+
+
+def _parse_source(code: str, filename: str) -> ast.Module:
+    """Parse module source; top-level so it can run in a worker process."""
+    return ast.parse(code, filename=filename, feature_version=sys.version_info[:2])
+
+
+def _compile_search(tokens: List[str]) -> Tuple[Callable[[bytes], List[Tuple[int, int]]], bool]:
+    """Build a case-insensitive scanner returning (offset, token index) for every token hit in a buffer.
+
+    Uses a hyperscan database when available, then RE2, then the standard library's re. Also returns
+    whether the scanner accepts any buffer, such as an mmap, rather than only bytes.
+    """
+    try:
+        import hyperscan
+    except ImportError:
+        hyperscan = None
+    if hyperscan is not None:
+        patterns = [re.escape(token).encode("utf-8") for token in tokens]
+        db = hyperscan.Database()
+        db.compile(
+            expressions=patterns,
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(patterns),
+        )
+
+        def scan(buf) -> List[Tuple[int, int]]:
+            hits = []
+
+            def on_match(token_id, start, end, flags, context):
+                hits.append((start, token_id))
+
+            # A scratch space per call keeps concurrent scans from different threads apart.
+            db.scan(buf, match_event_handler=on_match, scratch=hyperscan.Scratch(db))
+            return sorted(hits)
+        return scan, False
+    try:
+        import re2 as regex
+    except ImportError:
+        regex = re
+    # An alternation stops at its first matching branch, so longer tokens go first and each hit also
+    # counts the shorter tokens it contains ("files" is a hit for "file" too), as hyperscan reports them.
+    by_length = sorted(tokens, key=len, reverse=True)
+    pattern = regex.compile(b"|".join(re.escape(token).encode("utf-8") for token in by_length), regex.IGNORECASE)
+    contained = {
+        token.encode("utf-8"): [(token.find(other), i) for i, other in enumerate(tokens) if other in token]
+        for token in tokens
+    }
+
+    def scan(buf) -> List[Tuple[int, int]]:
+        return [(m.start() + offset, token_id) for m in pattern.finditer(buf)
+                for offset, token_id in contained[m.group(0).lower()]]
+    return scan, True
+
+
+def _search_file(scan: Callable[[bytes], List[Tuple[int, int]]], path: str,
+                 mappable: bool = True) -> List[Tuple[int, str, int, str]]:
+    """Return (distinct tokens, path, line number, line) for each line of a markdown file with a token hit."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+        if not mappable:
+            content = file.read()
+            return _line_matches(scan(content), content, path)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return _line_matches(scan(buf), buf, path)
+
+
+def _line_matches(hits: List[Tuple[int, int]], buf, path: str) -> List[Tuple[int, str, int, str]]:
+    """Group token hits in a file's contents by line, as _search_file returns them."""
+    lines = {}
+    for offset, token_id in hits:
+        start = buf.rfind(b"\n", 0, offset) + 1
+        lines.setdefault(start, set()).add(token_id)
+    matches = []
+    lineno, counted = 1, 0
+    for start in sorted(lines):
+        lineno += buf[counted:start].count(b"\n")
+        counted = start
+        end = buf.find(b"\n", start)
+        line = buf[start:end if end != -1 else len(buf)].decode("utf-8", errors="replace").strip()
+        matches.append((len(lines[start]), path, lineno, line))
+    return matches
+
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+# Fields of compound statements (if/for/while/try/with/match and their clauses) holding nested statements.
+_BLOCK_FIELDS = ("body", "handlers", "orelse", "finalbody", "cases")
+
+
+def _iter_function_nodes(body: List[ast.AST], scope: Tuple[str, ...] = ()) -> Iterator[Tuple[ast.AST, str]]:
+    """Yield (node, qualname) for functions and methods, visiting statement blocks only.
+
+    Expressions are never walked and function bodies are not entered, so the cost scales with the
+    number of statements rather than the number of AST nodes.
+    """
+    for node in body:
+        if isinstance(node, _FUNCTION_NODES):
+            yield node, ".".join(scope + (node.name,))
+        elif isinstance(node, ast.ClassDef):
+            yield from _iter_function_nodes(node.body, scope + (node.name,))
+        else:
+            for name in _BLOCK_FIELDS:
+                block = getattr(node, name, None)
+                if block:
+                    yield from _iter_function_nodes(block, scope)
+
+
 class DocEnhancer:
-    def __init__(self, provider: str, api_key: str = None, model: str = None, language: str = "en"):
+    def __init__(self, provider: str, api_key: str = None, model: str = None, language: str = "en",
+                 num_concurrent: int = 10, max_attempts: int = 5, cache: bool = True, cache_dir: str = None,
+                 local_workers: int = 1, max_requests_per_minute: float = 1500,
+                 max_tokens_per_minute: float = 125000):
         """
         Initialize PyDocEnhancer with an AI provider.
         :param provider: AI provider ("openai", "local").
         :param api_key: API key for cloud providers (optional).
         :param model: Model name for LLM (e.g., "llama3.2" for local).
         :param language: Output language for documentation (default: "en").
+        :param num_concurrent: Maximum number of LLM requests in flight at once (default: 10).
+        :param max_attempts: Attempts per LLM request before giving up on rate limits or server errors (default: 5).
+        :param cache: Reuse LLM responses for unchanged inputs across runs (default: True).
+        :param cache_dir: Directory holding the response cache (default: "~/.cache/pydocenhancer").
+        :param local_workers: Worker processes for ctransformers models, each loading its own copy of the
+            model and sharing the CPU cores between them (default: 1, run in-process).
+        :param max_requests_per_minute: OpenAI request budget (default: 1500).
+        :param max_tokens_per_minute: OpenAI prompt-token budget (default: 125000).
         """
         if provider is None or provider == "mock":
             raise ValueError("A real LLM provider is required. Please specify --provider local or --provider openai and a valid model.")
+        if provider not in ("openai", "local"):
+            raise ValueError(f"Unsupported provider: {provider}. Supported providers are 'openai' and 'local'.")
         self.provider = provider
+        # Resolved once so each LLM call dispatches on a plain string compare.
+        self._backend = "ollama" if provider == "local" and model and "ollama" in model.lower() else provider
         self.api_key = api_key
         self.model = model
         self.language = language
-        self.llm = self._init_llm()
-
-    def _init_llm(self):
-        """Initialize the LLM client based on provider."""
-        if self.provider == "openai":
-            import openai
-            openai.api_key = self.api_key
-            return openai
-        elif self.provider == "local" and self.model and "ollama" in self.model.lower():
-            # No client needed, will use requests to localhost
-            return "ollama"
-        elif self.provider == "local":
+        self.num_concurrent = num_concurrent
+        self.max_attempts = max_attempts
+        self.local_workers = local_workers
+        self._local_pool = None
+        self._rate_limiter = RateLimiter(max_requests_per_minute, max_tokens_per_minute)
+        self.cache = None
+        if cache:
             try:
-                from ctransformers import AutoModelForCausalLM
-                llm = AutoModelForCausalLM.from_pretrained(self.model)
-                return llm
-            except ImportError:
-                raise ImportError("ctransformers is required for local LLMs. Install with 'pip install pydocenhancer[local]'.")
-        else:
-            raise ValueError(f"Unsupported provider: {self.provider}. Supported providers are 'openai' and 'local'.")
+                self.cache = ResponseCache(os.path.join(cache_dir or CACHE_DIR, "responses.sqlite"))
+            except (OSError, sqlite3.Error):
+                # An unusable cache only costs repeated LLM requests; run without it.
+                pass
+
+    # Provider clients are created on first use: importing ctransformers and loading a model takes
+    # seconds, and Ollama or cached runs never need them.
+    @functools.cached_property
+    def _openai_mod(self):
+        import openai
+        openai.api_key = self.api_key
+        return openai
 
-    def _llm_ollama(self, prompt: str) -> str:
+    @functools.cached_property
+    def _local_model(self):
+        return _load_local_model(self.model)
+
+    @functools.cached_property
+    def _encoding(self):
+        try:
+            import tiktoken
+        except ImportError:
+            return None
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={"model": self.model.split("/", 1)[-1], "prompt": prompt, "stream": False},
+            return tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+
+    def _count_tokens(self, prompt: str) -> int:
+        """Count prompt tokens with tiktoken, or estimate four characters per token without it."""
+        if self._encoding is None:
+            return len(prompt) // 4 + 1
+        return len(self._encoding.encode(prompt))
+
+    def _ollama_payload(self, prompt: str, json_mode: bool = False) -> Dict:
+        payload = {"model": self.model.split("/", 1)[-1], "prompt": prompt, "stream": False}
+        if json_mode:
+            payload["format"] = "json"
+        return payload
+
+    def _openai_options(self, json_mode: bool = False) -> Dict:
+        options = {"temperature": 0.2}
+        if json_mode:
+            options["response_format"] = {"type": "json_object"}
+        return options
+
+    def _llm_ollama(self, prompt: str, json_mode: bool = False) -> str:
+        try:
+            response = _HTTP_SESSION.post(
+                OLLAMA_URL,
+                data=orjson.dumps(self._ollama_payload(prompt, json_mode)),
+                headers=JSON_HEADERS,
                 timeout=60
             )
             response.raise_for_status()
-            return response.json()["response"].strip()
+            return orjson.loads(response.content)["response"].strip()
         except requests.exceptions.RequestException as e:
             raise RuntimeError(f"Ollama LLM request failed: {e}")
         except Exception as e:
             raise RuntimeError(f"Unexpected error from Ollama LLM: {e}")
 
-    def _llm_openai(self, prompt: str) -> str:
+    def _llm_openai(self, prompt: str, json_mode: bool = False) -> str:
         try:
-            completion = self.llm.ChatCompletion.create(
+            completion = self._openai_mod.ChatCompletion.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
+                **self._openai_options(json_mode),
             )
             return completion.choices[0].message.content.strip()
         except Exception as e:
             raise RuntimeError(f"OpenAI LLM request failed: {e}")
 
     def _llm_local(self, prompt: str) -> str:
-        if not self.llm:
+        if not self._local_model:
             raise RuntimeError("Local LLM is not initialized.")
-        return self.llm(prompt)
+        return self._local_model(prompt)
 
-    def _llm(self, text: str, task: str, language: str = None) -> str:
+    async def _post_json_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                               url: str, payload: Dict, headers: Optional[Dict] = None,
+                               timeout: Optional[aiohttp.ClientTimeout] = None) -> Dict:
+        """POST a JSON payload, retrying with jittered exponential backoff on rate limits and server errors."""
+        for attempt in range(self.max_attempts):
+            try:
+                async with semaphore:
+                    async with session.post(url, data=orjson.dumps(payload), timeout=timeout or session.timeout,
+                                            headers={**JSON_HEADERS, **(headers or {})}) as response:
+                        response.raise_for_status()
+                        return orjson.loads(await response.read())
+            except (aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                await self._backoff(e, attempt)
+
+    async def _backoff(self, error: Exception, attempt: int, limiter: Optional[RateLimiter] = None) -> None:
+        """Re-raise errors that aren't worth retrying, otherwise sleep before the next attempt."""
+        if attempt == self.max_attempts - 1:
+            raise error
+        if isinstance(error, aiohttp.ClientResponseError):
+            if error.status not in RETRY_STATUSES:
+                raise error
+            if error.status == 429 and limiter is not None:
+                limiter.pause(RATE_LIMIT_COOLDOWN)
+        await asyncio.sleep(2 ** attempt + random.random())
+
+    async def _llm_ollama_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                prompt: str, json_mode: bool = False) -> str:
+        try:
+            # Time out stalled reads rather than whole requests, which may sit in Ollama's queue.
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=OLLAMA_READ_TIMEOUT)
+            data = await self._post_json_async(session, semaphore, OLLAMA_URL,
+                                               self._ollama_payload(prompt, json_mode), timeout=timeout)
+            return data["response"].strip()
+        except aiohttp.ClientError as e:
+            raise RuntimeError(f"Ollama LLM request failed: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error from Ollama LLM: {e}")
+
+    async def _llm_openai_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                prompt: str, json_mode: bool = False) -> str:
+        try:
+            chunks = [chunk async for chunk in self._llm_openai_stream_async(session, semaphore, prompt, json_mode)]
+            return "".join(chunks).strip()
+        except Exception as e:
+            raise RuntimeError(f"OpenAI LLM request failed: {e}")
+
+    async def _llm_openai_stream_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                       prompt: str, json_mode: bool = False) -> AsyncIterator[str]:
+        """Yield an OpenAI completion's content as it is generated, using server-sent events."""
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            **self._openai_options(json_mode),
+        }
+        headers = {**JSON_HEADERS, "Authorization": f"Bearer {self.api_key}"}
+        tokens = self._count_tokens(prompt)
+        # Long completions can outlast the session's total timeout; only a stalled stream should fail.
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=60)
+        for attempt in range(self.max_attempts):
+            started = False
+            try:
+                await self._rate_limiter.acquire(tokens)
+                async with semaphore:
+                    async with session.post(OPENAI_URL, data=orjson.dumps(payload), headers=headers,
+                                            timeout=timeout) as response:
+                        response.raise_for_status()
+                        async for line in response.content:
+                            line = line.strip()
+                            if not line.startswith(b"data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == b"[DONE]":
+                                return
+                            choices = orjson.loads(data).get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                started = True
+                                yield delta
+                        return
+            except (aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                if started:
+                    # Retrying would repeat the content already yielded.
+                    raise
+                await self._backoff(e, attempt, self._rate_limiter)
+
+    async def _llm_local_async(self, semaphore: asyncio.Semaphore, prompt: str) -> str:
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            if isinstance(self._local_pool, ThreadPoolExecutor):
+                return await loop.run_in_executor(self._local_pool, self._llm_local, prompt)
+            return await loop.run_in_executor(self._local_pool, _worker_llm, prompt)
+
+    @contextlib.contextmanager
+    def _worker_pool(self, num_jobs: int) -> Iterator[None]:
+        """Run local ctransformers prompts on worker processes, since they are CPU-bound rather than network-bound."""
+        if self._backend != "local":
+            yield
+            return
+        workers = min(self.local_workers, num_jobs)
+        if workers < 2:
+            # ctransformers models aren't thread-safe: a single thread loads the in-process model once
+            # and runs its prompts one at a time.
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                self._local_pool = pool
+                try:
+                    yield
+                finally:
+                    self._local_pool = None
+            return
+        # Split the cores so the workers' models don't each spawn a thread per CPU and oversubscribe.
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.model, threads)) as pool:
+            self._local_pool = pool
+            try:
+                yield
+            finally:
+                self._local_pool = None
+
+    def _cache_key(self, text: str, task: str, lang: str) -> Optional[bytes]:
+        return ResponseCache.key(self.model, task, lang, text) if self.cache else None
+
+    async def _llm_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                         text: str, task: str, language: str = None) -> str:
         lang = language or self.language
-        prompt = ""
-        if task == "summarize":
-            prompt = f"Summarize the following Python code in {lang}:\n{text}"
-        elif task == "explain":
-            prompt = f"Explain what the following Python code does in {lang}:\n{text}"
-        elif task == "translate":
-            prompt = f"Translate the following documentation to {lang}:\n{text}"
-        elif task == "example":
-            prompt = f"Generate a usage example for the following Python function in {lang}:\n{text}"
+        key = self._cache_key(text, task, lang)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        prompt = _PROMPTS.get(task, "{text}").format(lang=lang, text=text)
+        json_mode = task == "multi"
+        if self._backend == "ollama":
+            result = await self._llm_ollama_async(session, semaphore, prompt, json_mode)
+        elif self._backend == "openai":
+            result = await self._llm_openai_async(session, semaphore, prompt, json_mode)
         else:
-            prompt = text
-
-        if self.provider == "openai":
-            return self._llm_openai(prompt)
-        elif self.provider == "local" and self.model and "ollama" in self.model.lower():
-            return self._llm_ollama(prompt)
-        elif self.provider == "local":
-            return self._llm_local(prompt)
+            result = await self._llm_local_async(semaphore, prompt)
+        if key is not None:
+            self.cache.set(key, result)
+        return result
+
+    def _llm(self, text: str, task: str, language: str = None) -> str:
+        lang = language or self.language
+        key = self._cache_key(text, task, lang)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        prompt = _PROMPTS.get(task, "{text}").format(lang=lang, text=text)
+        json_mode = task == "multi"
+        if self._backend == "ollama":
+            result = self._llm_ollama(prompt, json_mode)
+        elif self._backend == "openai":
+            result = self._llm_openai(prompt, json_mode)
         else:
-            raise ValueError("A real LLM provider is required. The 'mock' provider is not supported.")
+            result = self._llm_local(prompt)
+        if key is not None:
+            self.cache.set(key, result)
+        return result
 
-    def parse_module(self, module_path: str) -> List[Dict]:
+    @staticmethod
+    def _multi_text(docstring: str, source: str) -> str:
+        return f"Docstring:\n{docstring}\n\nSource:\n{source}"
+
+    def _parse_multi_response_cached(self, raw: str, text: str, language: str = None) -> Dict[str, str]:
+        try:
+            return self._parse_multi_response(raw)
+        except ValueError:
+            # Don't keep serving a malformed response from the cache.
+            key = self._cache_key(text, "multi", language or self.language)
+            if key is not None:
+                self.cache.discard(key)
+            raise
+
+    @staticmethod
+    def _parse_multi_response(raw: str) -> Dict[str, str]:
+        """Split a fused "multi" response into its translation, summary, explanation and example."""
+        try:
+            data = orjson.loads(raw)
+        except ValueError:
+            # Models without a JSON mode often wrap the object in a fenced code block.
+            match = _FENCED_JSON_RE.search(raw)
+            if not match:
+                raise ValueError(f"LLM did not return a JSON object: {raw[:80]!r}")
+            data = orjson.loads(match.group(1))
+        if not isinstance(data, dict):
+            raise ValueError(f"LLM did not return a JSON object: {raw[:80]!r}")
+        return {key: "" if data.get(key) is None else str(data[key]) for key in MULTI_KEYS}
+
+    def _llm_multi(self, text_doc: str, text_source: str, language: str = None) -> Dict[str, str]:
+        """Run all four documentation tasks for one function in a single LLM call."""
+        text = self._multi_text(text_doc, text_source)
+        return self._parse_multi_response_cached(self._llm(text, "multi", language), text, language)
+
+    async def _llm_multi_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                               text_doc: str, text_source: str, language: str = None) -> Dict[str, str]:
+        text = self._multi_text(text_doc, text_source)
+        raw = await self._llm_async(session, semaphore, text, "multi", language)
+        return self._parse_multi_response_cached(raw, text, language)
+
+    def _session(self) -> aiohttp.ClientSession:
+        """Create the HTTP session shared by every LLM request of one run."""
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+
+    def parse_module(self, module_path: str) -> FunctionBatch:
         """Parse a Python module and extract function details."""
+        batch = FunctionBatch()
+        for func in self.iter_functions(module_path):
+            batch.append(func)
+        return batch
+
+    def parse_modules(self, module_paths: List[str]) -> Dict[str, FunctionBatch]:
+        """Parse several modules, overlapping their file reads and parses and sharing one LLM request pool."""
+        loaded = self._load_modules(module_paths)
+        return asyncio.run(self._parse_modules_async(module_paths, loaded))
+
+    async def _parse_modules_async(self, module_paths: List[str],
+                                   loaded: Dict[str, Tuple[ast.Module, Optional[List[str]]]]) -> Dict[str, FunctionBatch]:
+        semaphore = asyncio.Semaphore(self.num_concurrent)
+        modules = [self._extract_functions(module_path, loaded[module_path]) for module_path in module_paths]
+        with self._worker_pool(sum(len(records) for records in modules)):
+            async with self._session() as session:
+                async def collect(records: List[Tuple[Dict, str, Optional[str]]]) -> FunctionBatch:
+                    batch = FunctionBatch()
+                    async for func in self._aiter_functions(records, session, semaphore):
+                        batch.append(func)
+                    return batch
+                results = await asyncio.gather(*[collect(records) for records in modules])
+        return dict(zip(module_paths, results))
+
+    def iter_functions(self, module_path: str) -> Iterator[Dict]:
+        """Yield function details for a module one at a time, in source order, as their LLM output arrives."""
+        records = self._extract_functions(module_path)
+        loop = asyncio.new_event_loop()
+        functions = self._aiter_functions(records)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(functions.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(functions.aclose())
+            loop.close()
+
+    @staticmethod
+    def _stat_module(module_path: str) -> os.stat_result:
+        try:
+            return os.stat(module_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Module file not found: {module_path}")
+        except Exception as e:
+            raise RuntimeError(f"Error reading file {module_path}: {e}")
+
+    @staticmethod
+    def _read_module(module_path: str) -> str:
         try:
             with open(module_path, "r") as file:
-                code = file.read()
+                return file.read()
         except FileNotFoundError:
             raise FileNotFoundError(f"Module file not found: {module_path}")
         except PermissionError:
             raise PermissionError(f"Permission denied when reading: {module_path}")
         except Exception as e:
             raise RuntimeError(f"Error reading file {module_path}: {e}")
+
+    @staticmethod
+    def _cached_module(path: str, st: os.stat_result) -> Optional[Tuple[ast.Module, Optional[List[str]]]]:
+        cached = _AST_CACHE.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _AST_CACHE.move_to_end(path)
+            return cached[2], cached[3]
+        return None
+
+    @staticmethod
+    def _cache_module(path: str, st: os.stat_result, tree: ast.Module,
+                      code: str) -> Tuple[ast.Module, Optional[List[str]]]:
+        lines = None if hasattr(ast, "unparse") else code.splitlines()
+        _AST_CACHE[path] = (st.st_mtime_ns, st.st_size, tree, lines)
+        _AST_CACHE.move_to_end(path)
+        while len(_AST_CACHE) > AST_CACHE_SIZE:
+            _AST_CACHE.popitem(last=False)
+        return tree, lines
+
+    def _load_module(self, module_path: str) -> Tuple[ast.Module, Optional[List[str]]]:
+        """Read and parse a module, reusing the previous parse while its mtime and size are unchanged."""
+        path = os.path.abspath(module_path)
+        st = self._stat_module(module_path)
+        cached = self._cached_module(path, st)
+        if cached:
+            return cached
+        code = self._read_module(module_path)
         try:
-            tree = ast.parse(code)
+            tree = _parse_source(code, path)
         except SyntaxError as e:
             raise SyntaxError(f"Syntax error in {module_path}: {e}")
         except Exception as e:
             raise RuntimeError(f"Error parsing AST for {module_path}: {e}")
-        functions = []
+        return self._cache_module(path, st, tree, code)
+
+    def _load_modules(self, module_paths: List[str]) -> Dict[str, Tuple[ast.Module, Optional[List[str]]]]:
+        """Load several modules, reading stale ones on a thread pool and parsing them on a process pool.
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_name = node.name
-                docstring = ast.get_docstring(node) or "No docstring"
-                # Safely extract source code from the AST node
+        Returns each module's tree and lines by path, since the bounded AST cache may not hold them all.
+        """
+        loaded, stale = {}, []
+        for module_path in module_paths:
+            path = os.path.abspath(module_path)
+            st = self._stat_module(module_path)
+            cached = self._cached_module(path, st)
+            if cached:
+                loaded[module_path] = cached
+            else:
+                stale.append((module_path, path, st))
+        workers = min(len(stale), os.cpu_count() or 1)
+        if workers < 2:
+            # Without a second core or module, pickling trees back from a process pool only adds cost.
+            for module_path, _, _ in stale:
+                loaded[module_path] = self._load_module(module_path)
+            return loaded
+        # ast.parse holds the GIL, so parsing only runs in parallel across processes. Each parse is
+        # submitted as soon as its read completes, so reads and parses overlap.
+        with ThreadPoolExecutor(max_workers=workers) as threads, ProcessPoolExecutor(max_workers=workers) as processes:
+            reads = {threads.submit(self._read_module, module_path): (module_path, path) for module_path, path, _ in stale}
+            parses = {}
+            for read in as_completed(reads):
+                module_path, path = reads[read]
+                code = read.result()
+                parses[module_path] = code, processes.submit(_parse_source, code, path)
+            for module_path, path, st in stale:
+                code, future = parses[module_path]
                 try:
-                    # Try to use ast.unparse (Python 3.9+)
+                    tree = future.result()
+                except SyntaxError as e:
+                    raise SyntaxError(f"Syntax error in {module_path}: {e}")
+                except Exception as e:
+                    raise RuntimeError(f"Error parsing AST for {module_path}: {e}")
+                loaded[module_path] = self._cache_module(path, st, tree, code)
+        return loaded
+
+    def _extract_functions(self, module_path: str, module: Optional[Tuple[ast.Module, Optional[List[str]]]] = None
+                           ) -> List[Tuple[Dict, str, Optional[str]]]:
+        """Read and parse a module, returning each function's static details, raw docstring and example code."""
+        tree, lines = module or self._load_module(module_path)
+        records = []
+        # ast.unparse is Python 3.9+; older versions slice the original source instead.
+        source_lines = None if hasattr(ast, "unparse") else lines
+
+        for node, qualname in _iter_function_nodes(tree.body):
+            docstring = ast.get_docstring(node) or "No docstring"
+            # Safely extract source code from the AST node
+            try:
+                if source_lines is None:
                     source = ast.unparse(node)
-                except AttributeError:
-                    # Fallback for older Python versions: extract from original code
-                    source_lines = code.splitlines()
+                else:
                     start_line = node.lineno - 1  # AST line numbers are 1-indexed
-                    end_line = node.end_lineno if hasattr(node, 'end_lineno') else start_line + 1
+                    end_line = getattr(node, "end_lineno", None) or start_line + 1
                     source = '\n'.join(source_lines[start_line:end_line])
-                except Exception as e:
-                    source = f"Error extracting source: {e}"
-                example = self.extract_example_from_docstring(docstring)
-                try:
-                    docstring_translated = self._llm(docstring, "translate", self.language)
-                except Exception as e:
-                    docstring_translated = f"Error from LLM: {e}"
-                try:
-                    summary = self._llm(docstring, "summarize", self.language)
-                except Exception as e:
-                    summary = f"Error from LLM: {e}"
-                try:
-                    explanation = self._llm(source, "explain", self.language)
-                except Exception as e:
-                    explanation = f"Error from LLM: {e}"
-                try:
-                    example_out = self._llm(source, "example", self.language)
-                except Exception as e:
-                    example_out = f"Error from LLM: {e}"
-                functions.append({
-                    "name": func_name,
-                    "docstring": docstring_translated,
-                    "source": source,
-                    "summary": summary,
-                    "explanation": explanation,
-                    "example": example_out,
-                    "example_test_result": self.test_example_code(example) if example else None
-                })
-        return functions
+            except Exception as e:
+                source = f"Error extracting source: {e}"
+            # Most docstrings have no example block; a substring check skips the regex for them.
+            example = self.extract_example_from_docstring(docstring) if "Example" in docstring else None
+            records.append(({
+                "name": node.name,
+                "qualname": qualname,
+                "source": source,
+            }, docstring, example))
+        return records
+
+    async def _aiter_functions(self, records: List[Tuple[Dict, str, Optional[str]]], session: aiohttp.ClientSession = None,
+                               semaphore: asyncio.Semaphore = None) -> AsyncIterator[Dict]:
+        """Dispatch the LLM requests and example runs for all functions concurrently, yielding each one in order."""
+        semaphore = semaphore or asyncio.Semaphore(self.num_concurrent)
+        example_semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        async with contextlib.AsyncExitStack() as stack:
+            if session is None:
+                stack.enter_context(self._worker_pool(len(records)))
+                session = await stack.enter_async_context(self._session())
+            pending = deque(
+                (func,
+                 asyncio.ensure_future(
+                     self._llm_multi_async(session, semaphore, docstring, func["source"], self.language)),
+                 asyncio.ensure_future(self._test_example_code_async(example, example_semaphore)) if example else None)
+                for func, docstring, example in records
+            )
+            try:
+                while pending:
+                    func, task, example_task = pending.popleft()
+                    try:
+                        result = await task
+                    except Exception as e:
+                        result = dict.fromkeys(MULTI_KEYS, f"Error from LLM: {e}")
+                    yield {
+                        **func,
+                        "docstring": result["translation"],
+                        "summary": result["summary"],
+                        "explanation": result["explanation"],
+                        "example": result["example"],
+                        "example_test_result": await example_task if example_task else None,
+                    }
+            finally:
+                # A consumer that stops early leaves tasks behind; wait for them to unwind so example
+                # subprocesses are reaped before the session and event loop close.
+                tasks = [t for _, task, example_task in pending for t in (task, example_task) if t]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
 
     def extract_example_from_docstring(self, docstring: str) -> Optional[str]:
         """Extract example code from a docstring if present."""
-        # Simple heuristic: look for lines starting with 'Example:' or code blocks
-        lines = docstring.splitlines()
-        example_lines = []
-        in_example = False
-        for line in lines:
-            if 'Example' in line:
-                in_example = True
-                continue
-            if in_example:
-                if line.strip() == '' or line.strip().startswith('>>>'):
-                    continue
-                if line.strip().startswith('"""') or line.strip().startswith("'''"):
-                    break
-                example_lines.append(line)
+        match = _EXAMPLE_RE.search(docstring)
+        if not match:
+            return None
+        example_lines = _EXAMPLE_LINE_RE.findall(match.group(1))
         return '\n'.join(example_lines).strip() if example_lines else None
 
+    @staticmethod
+    def _example_result(returncode: int, stdout: str, stderr: str) -> str:
+        if returncode == 0:
+            return f"Success. Output:\n{stdout}"
+        lines = stderr.strip().splitlines()
+        return f"Error: {lines[-1] if lines else f'exit status {returncode}'}"
+
     def test_example_code(self, code: str) -> str:
-        """Run the example code and return the output or error."""
+        """Run the example code in an isolated interpreter and return the output or error."""
         if not code:
             return "No example to test."
         try:
-            # Redirect stdout to capture print output
-            stdout = io.StringIO()
-            with contextlib.redirect_stdout(stdout):
-                exec(code, {})
-            return f"Success. Output:\n{stdout.getvalue()}"
+            completed = subprocess.run(
+                [sys.executable, "-I", "-c", code],
+                capture_output=True, text=True, timeout=EXAMPLE_TIMEOUT,
+            )
+        except subprocess.TimeoutExpired:
+            return f"Error: Example timed out after {EXAMPLE_TIMEOUT} seconds"
         except Exception as e:
             return f"Error: {e}"
+        return self._example_result(completed.returncode, completed.stdout, completed.stderr)
+
+    async def _test_example_code_async(self, code: str, semaphore: asyncio.Semaphore) -> str:
+        """Asynchronous test_example_code, so examples run while LLM requests are in flight."""
+        async with semaphore:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable, "-I", "-c", code,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                )
+            except Exception as e:
+                return f"Error: {e}"
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), EXAMPLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return f"Error: Example timed out after {EXAMPLE_TIMEOUT} seconds"
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        return self._example_result(process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
 
     def generate_docs(self, module_path: str, output_dir: str, language: Optional[str] = None) -> None:
         """Generate markdown documentation for a module, optionally in a different language."""
@@ -197,27 +909,55 @@ class DocEnhancer:
                 os.makedirs(output_dir)
             except Exception as e:
                 raise RuntimeError(f"Could not create output directory {output_dir}: {e}")
+        asyncio.run(self._generate_docs_async(module_path, output_dir, language))
+
+    @staticmethod
+    def _format_function(func: Dict) -> str:
+        """Render one function's markdown section as a single string, so it costs one write."""
+        parts = [
+            f"## Function: {func['qualname']}\n",
+            f"**Docstring**: {func['docstring']}\n\n",
+            f"**Summary**: {func['summary']}\n\n",
+            f"**Explanation**: {func['explanation']}\n\n",
+        ]
+        if func['example']:
+            parts.append(f"**Example**:\n```python\n{func['example']}\n```\n\n")
+            parts.append(f"**Example Test Result**: {func['example_test_result']}\n\n")
+        parts.append("```python\n" + func['source'] + "\n```\n\n")
+        return "".join(parts)
+
+    async def _generate_docs_async(self, module_path: str, output_dir: str, language: Optional[str] = None) -> None:
         lang = language or self.language
         try:
-            functions = self.parse_module(module_path)
+            records = self._extract_functions(module_path)
         except Exception as e:
             raise RuntimeError(f"Failed to parse module: {e}")
         output_file = os.path.join(output_dir, f"{os.path.basename(module_path)}.{lang}.md")
         try:
             with open(output_file, "w", encoding="utf-8") as f:
                 f.write(f"# Documentation for {os.path.basename(module_path)} [{lang}]\n\n")
-                for func in functions:
-                    f.write(f"## Function: {func['name']}\n")
-                    f.write(f"**Docstring**: {func['docstring']}\n\n")
-                    f.write(f"**Summary**: {func['summary']}\n\n")
-                    f.write(f"**Explanation**: {func['explanation']}\n\n")
-                    if func['example']:
-                        f.write(f"**Example**:\n```python\n{func['example']}\n```\n\n")
-                        f.write(f"**Example Test Result**: {func['example_test_result']}\n\n")
-                    f.write("```python\n" + func['source'] + "\n```\n\n")
+                count = 0
+                async for func in self._aiter_functions(records):
+                    f.write(self._format_function(func))
+                    del func
+                    count += 1
+                    if count % FLUSH_EVERY == 0:
+                        f.flush()
         except Exception as e:
             raise RuntimeError(f"Failed to write documentation file: {e}")
 
-    def search_docs(self, query: str, docs_dir: str) -> List[str]:
-        """Search documentation using a natural language query (mock implementation)."""
-        return [f"Found match for '{query}' in {docs_dir} (mock result)"] 
\ No newline at end of file
+    @staticmethod
+    def search_docs(query: str, docs_dir: str, max_results: int = 20) -> List[str]:
+        """Search markdown documentation for the lines matching the most words of a natural language query."""
+        if not os.path.isdir(docs_dir):
+            raise FileNotFoundError(f"Documentation directory not found: {docs_dir}")
+        tokens = sorted({token.lower() for token in _QUERY_TOKEN_RE.findall(query)})
+        paths = sorted(glob.glob(os.path.join(docs_dir, "**", "*.md"), recursive=True))
+        if not tokens or not paths:
+            return []
+        scan, mappable = _compile_search(tokens)
+        with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+            matches = [match for file_matches in pool.map(lambda path: _search_file(scan, path, mappable), paths)
+                       for match in file_matches]
+        matches.sort(key=lambda match: (-match[0], match[1], match[2]))
+        return [f"{path}:{lineno}: {line}" for _, path, lineno, line in matches[:max_results]]
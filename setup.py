@@ -14,11 +14,14 @@ setup(
     install_requires=[
         "sentence-transformers>=2.2.2",
         "click>=8.1.0",
+        "aiohttp>=3.8.0",
+        "orjson>=3.8.0",
     ],
     extras_require={
-        "cloud": ["openai>=1.0.0", "anthropic>=0.3.0"],
+        "cloud": ["openai>=1.0.0", "anthropic>=0.3.0", "tiktoken>=0.5.0"],
         "local": ["ctransformers>=0.2.27"],
         "llama": ["llama-cpp-python>=0.2.0"],
+        "search": ["hyperscan>=0.4.0"],
     },
     entry_points={
         "console_scripts": [
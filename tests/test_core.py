@@ -1,6 +1,11 @@
 import pytest
+from pydocenhancer import core
 from pydocenhancer.core import DocEnhancer
 import os
+import json
+import time
+import asyncio
+import aiohttp
 import tempfile
 import shutil
 from unittest import mock
@@ -8,10 +13,32 @@ import click
 from click.testing import CliRunner
 from pydocenhancer import cli
 
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep every test's response cache out of the user's ~/.cache."""
+    monkeypatch.setattr(core, "CACHE_DIR", str(tmp_path / "default-cache"))
+
 @pytest.fixture
 def enhancer():
     return DocEnhancer(provider="local", model="ollama/llama3.2:latest")
 
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Answer an enhancer's Ollama requests with ``responder(prompt)`` merged over placeholder fields.
+
+    Returns the list of prompts sent, so tests can count requests.
+    """
+    def install(enhancer, responder=lambda prompt: {}):
+        prompts = []
+        async def fake_ollama(session, semaphore, prompt, json_mode=False):
+            assert json_mode
+            prompts.append(prompt)
+            fields = {"translation": "Doc", "summary": "Sum", "explanation": "Exp", "example": ""}
+            return json.dumps({**fields, **responder(prompt)})
+        monkeypatch.setattr(enhancer, "_llm_ollama_async", fake_ollama)
+        return prompts
+    return install
+
 def test_parse_module(enhancer, tmp_path):
     # Create a sample Python file
     sample_file = tmp_path / "sample.py"
@@ -68,7 +95,7 @@ def test_llm_ollama_network_error(monkeypatch):
     enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest")
     def fail_post(*args, **kwargs):
         raise Exception("Network down!")
-    monkeypatch.setattr("requests.post", fail_post)
+    monkeypatch.setattr(core._HTTP_SESSION, "post", fail_post)
     with pytest.raises(RuntimeError):
         enhancer._llm_ollama("prompt")
 
@@ -104,4 +131,486 @@ def foo():
     output_dir = tmp_path / "docs"
     runner = CliRunner()
     result = runner.invoke(cli.cli, ["enhance", "--module", str(sample_file), "--output", str(output_dir), "--provider", "local", "--model", "ollama/llama3.2:latest"])
-    assert result.exit_code == 0 
\ No newline at end of file
+    assert result.exit_code == 0 
+
+def test_parse_module_concurrent_dispatch(tmp_path, fake_llm):
+    sample_file = tmp_path / "pair.py"
+    sample_file.write_text("""
+def foo():
+    '''Foo docstring.'''
+    return 1
+
+def bar():
+    '''Bar docstring.'''
+    return 2
+""")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    def respond(prompt):
+        name = "foo" if "return 1" in prompt else "bar"
+        return {"translation": f"{name} doc", "summary": f"{name} summary",
+                "explanation": f"{name} explanation", "example": f"{name}()"}
+    fake_llm(enhancer, respond)
+    functions = enhancer.parse_module(str(sample_file))
+    assert [f["name"] for f in functions] == ["foo", "bar"]
+    assert functions[0]["docstring"] == "foo doc"
+    assert functions[0]["summary"] == "foo summary"
+    assert functions[1]["explanation"] == "bar explanation"
+    assert functions[1]["example"] == "bar()"
+
+def test_parse_multi_response_fenced_json():
+    raw = 'Sure!\n```json\n{"translation": "Doc", "summary": "Sum", "explanation": "Exp"}\n```'
+    result = DocEnhancer._parse_multi_response(raw)
+    assert result == {"translation": "Doc", "summary": "Sum", "explanation": "Exp", "example": ""}
+    with pytest.raises(ValueError):
+        DocEnhancer._parse_multi_response("not json at all")
+
+def test_parse_module_uses_response_cache(tmp_path, fake_llm):
+    sample_file = tmp_path / "cached.py"
+    sample_file.write_text("def foo():\n    '''Docstring.'''\n    return 1\n")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache_dir=str(tmp_path / "cache"))
+    calls = fake_llm(enhancer, lambda prompt: {"example": "foo()"})
+    first = enhancer.parse_module(str(sample_file))
+    second = enhancer.parse_module(str(sample_file))
+    assert len(calls) == 1
+    assert first == second
+
+def test_parse_module_methods_and_nested_functions(tmp_path):
+    sample_file = tmp_path / "scopes.py"
+    sample_file.write_text("""
+class Greeter:
+    def greet(self):
+        def helper():
+            return "hi"
+        return helper()
+
+async def fetch():
+    return 1
+""")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    functions = enhancer.parse_module(str(sample_file))
+    assert [f["qualname"] for f in functions] == ["Greeter.greet", "fetch"]
+    assert [f["name"] for f in functions] == ["greet", "fetch"]
+
+def test_response_cache_errors_are_misses(tmp_path, fake_llm):
+    sample_file = tmp_path / "cached.py"
+    sample_file.write_text("def foo():\n    return 1\n")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest")
+    calls = fake_llm(enhancer)
+    enhancer.cache._conn.execute("DROP TABLE responses")
+    functions = enhancer.parse_module(str(sample_file))
+    assert functions[0]["docstring"] == "Doc"
+    assert len(calls) == 1
+
+def test_unusable_response_cache_is_disabled(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "responses.sqlite").write_bytes(b"not a sqlite database" * 100)
+    assert DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache_dir=str(cache_dir)).cache is None
+    (tmp_path / "file").write_text("")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache_dir=str(tmp_path / "file" / "sub"))
+    assert enhancer.cache is None
+
+def test_generate_docs_streams_functions_in_order(tmp_path, fake_llm):
+    sample_file = tmp_path / "stream.py"
+    sample_file.write_text("def first():\n    return 1\n\ndef second():\n    return 2\n")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    fake_llm(enhancer, lambda prompt: {"summary": "first summary" if "first" in prompt else "second summary"})
+    assert [f["summary"] for f in enhancer.iter_functions(str(sample_file))] == ["first summary", "second summary"]
+    output_dir = tmp_path / "docs"
+    enhancer.generate_docs(str(sample_file), str(output_dir))
+    content = (output_dir / "stream.py.en.md").read_text()
+    assert content.index("## Function: first") < content.index("## Function: second")
+    assert "**Summary**: second summary" in content
+
+def test_iter_functions_reaps_examples_when_stopped_early(tmp_path, monkeypatch, fake_llm):
+    sample_file = tmp_path / "early.py"
+    sample_file.write_text(
+        "def first():\n    \"\"\"Example:\n    print(1)\n    \"\"\"\n\n"
+        "def second():\n    \"\"\"Example:\n    import time; time.sleep(30)\n    \"\"\"\n")
+    processes = []
+    create = asyncio.create_subprocess_exec
+    async def recording_create(*args, **kwargs):
+        processes.append(await create(*args, **kwargs))
+        return processes[-1]
+    monkeypatch.setattr(core.asyncio, "create_subprocess_exec", recording_create)
+    # Enough example slots that the second example starts while the first one runs.
+    monkeypatch.setattr(core.os, "cpu_count", lambda: 2)
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    fake_llm(enhancer)
+    for func in enhancer.iter_functions(str(sample_file)):
+        assert func["example_test_result"].startswith("Success")
+        break
+    assert len(processes) == 2
+    assert all(process.returncode is not None for process in processes)
+
+def test_load_module_reuses_parse_until_file_changes(tmp_path):
+    sample_file = tmp_path / "reparse.py"
+    sample_file.write_text("def foo():\n    return 1\n")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    tree, _ = enhancer._load_module(str(sample_file))
+    assert enhancer._load_module(str(sample_file))[0] is tree
+    sample_file.write_text("def foo():\n    return 1\n\ndef bar():\n    return 2\n")
+    assert enhancer._load_module(str(sample_file))[0] is not tree
+
+def test_ast_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    from collections import OrderedDict
+    monkeypatch.setattr(core, "_AST_CACHE", OrderedDict())
+    monkeypatch.setattr(core, "AST_CACHE_SIZE", 2)
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    paths = []
+    for name in ("alpha", "beta", "gamma"):
+        module = tmp_path / f"{name}.py"
+        module.write_text(f"def {name}():\n    return 1\n")
+        paths.append(str(module))
+    enhancer._load_module(paths[0])
+    enhancer._load_module(paths[1])
+    enhancer._load_module(paths[0])
+    enhancer._load_module(paths[2])
+    assert list(core._AST_CACHE) == [paths[0], paths[2]]
+    # Modules loaded together stay available even when the cache can't hold them all.
+    loaded = enhancer._load_modules(paths)
+    assert [[node.name for node in loaded[path][0].body] for path in paths] == [["alpha"], ["beta"], ["gamma"]]
+    assert len(core._AST_CACHE) == 2
+
+def test_load_modules_pools_only_with_spare_cores(tmp_path, monkeypatch):
+    paths = []
+    for name in ("alpha", "beta", "gamma"):
+        module = tmp_path / f"{name}.py"
+        module.write_text(f"def {name}():\n    return 1\n")
+        paths.append(str(module))
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a single core should parse in-process")
+    monkeypatch.setattr(core.os, "cpu_count", lambda: 1)
+    with monkeypatch.context() as patch:
+        patch.setattr(core, "ProcessPoolExecutor", no_pool)
+        loaded = enhancer._load_modules(paths)
+    assert [loaded[path][0].body[0].name for path in paths] == ["alpha", "beta", "gamma"]
+    for path in paths:
+        os.utime(path, ns=(0, 0))
+    (tmp_path / "broken.py").write_text("def broken(:\n    pass\n")
+    monkeypatch.setattr(core.os, "cpu_count", lambda: 2)
+    loaded = enhancer._load_modules(paths)
+    assert [loaded[path][0].body[0].name for path in paths] == ["alpha", "beta", "gamma"]
+    with pytest.raises(SyntaxError):
+        enhancer._load_modules(paths + [str(tmp_path / "broken.py")])
+
+def test_parse_modules(tmp_path, fake_llm):
+    paths = []
+    for name in ("alpha", "beta", "gamma"):
+        module = tmp_path / f"{name}.py"
+        module.write_text(f"def {name}():\n    return 1\n")
+        paths.append(str(module))
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    fake_llm(enhancer)
+    results = enhancer.parse_modules(paths)
+    assert [[f["name"] for f in results[path]] for path in paths] == [["alpha"], ["beta"], ["gamma"]]
+    (tmp_path / "broken.py").write_text("def broken(:\n    pass\n")
+    (tmp_path / "other.py").write_text("def other():\n    return 2\n")
+    with pytest.raises(SyntaxError):
+        enhancer.parse_modules(paths + [str(tmp_path / "broken.py"), str(tmp_path / "other.py")])
+
+def test_example_code_runs_in_subprocess(tmp_path, fake_llm):
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    assert enhancer.test_example_code("print(2 * 21)") == "Success. Output:\n42\n"
+    assert enhancer.test_example_code("1 / 0") == "Error: ZeroDivisionError: division by zero"
+    sample_file = tmp_path / "examples.py"
+    sample_file.write_text('''
+def double(x):
+    """Double x.
+
+    Example:
+        print(4)
+    """
+    return x * 2
+''')
+    fake_llm(enhancer, lambda prompt: {"example": "double(2)"})
+    functions = enhancer.parse_module(str(sample_file))
+    assert functions[0]["example_test_result"] == "Success. Output:\n4\n"
+
+def test_extract_example_from_docstring():
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    docstring = "Double x.\n\nExample:\n    >>> double(2)\n    print(double(2))\n\n    print(double(3))\n'''\nignored\n"
+    assert enhancer.extract_example_from_docstring(docstring) == "print(double(2))\n    print(double(3))"
+    assert enhancer.extract_example_from_docstring("Double x.") is None
+    assert enhancer.extract_example_from_docstring("Example:\n    >>> double(2)\n") is None
+    # Lines holding only a carriage return or form feed are blank too.
+    assert enhancer.extract_example_from_docstring("Example:\n    print(1)\n \r\n\f\n    print(2)\n") == "print(1)\n    print(2)"
+    assert enhancer.extract_example_from_docstring("Example:\n\r\n") is None
+
+def test_search_docs(tmp_path):
+    docs_dir = tmp_path / "docs"
+    (docs_dir / "nested").mkdir(parents=True)
+    (docs_dir / "utils.py.en.md").write_text("# Documentation for utils.py\n\n## Function: read_file\n**Summary**: Reads a file from disk.\n")
+    (docs_dir / "nested" / "io.py.en.md").write_text("## Function: write_file\n**Summary**: Writes data to a FILE handle.\n")
+    (docs_dir / "empty.md").write_text("")
+    results = DocEnhancer.search_docs("write file handle", str(docs_dir))
+    # Lines matching more distinct query words rank first.
+    assert results == [
+        f"{docs_dir / 'nested' / 'io.py.en.md'}:2: **Summary**: Writes data to a FILE handle.",
+        f"{docs_dir / 'nested' / 'io.py.en.md'}:1: ## Function: write_file",
+        f"{docs_dir / 'utils.py.en.md'}:3: ## Function: read_file",
+        f"{docs_dir / 'utils.py.en.md'}:4: **Summary**: Reads a file from disk.",
+    ]
+    assert DocEnhancer.search_docs("nothing here", str(docs_dir)) == []
+    with pytest.raises(FileNotFoundError):
+        DocEnhancer.search_docs("file", str(tmp_path / "missing"))
+
+class FakeHyperscanDatabase:
+    """Stands in for hyperscan.Database: reports every match of every pattern, overlapping ones included."""
+    scanned = []
+
+    def compile(self, expressions, ids, elements, flags):
+        import re
+        self.patterns = [(re.compile(b"(?=(%s))" % expression, re.IGNORECASE), i) for expression, i in zip(expressions, ids)]
+
+    def scan(self, data, match_event_handler, scratch):
+        self.scanned.append(type(data))
+        for pattern, i in self.patterns:
+            for m in pattern.finditer(data):
+                match_event_handler(i, m.start(1), m.end(1), 0, None)
+
+@pytest.fixture(params=["re", "hyperscan"])
+def search_backend(request, monkeypatch):
+    import sys
+    import types
+    monkeypatch.setitem(sys.modules, "re2", None)
+    if request.param == "hyperscan":
+        module = types.SimpleNamespace(Database=FakeHyperscanDatabase, Scratch=lambda db: None,
+                                       HS_FLAG_CASELESS=1, HS_FLAG_SOM_LEFTMOST=2)
+        monkeypatch.setitem(sys.modules, "hyperscan", module)
+        FakeHyperscanDatabase.scanned = []
+    else:
+        monkeypatch.setitem(sys.modules, "hyperscan", None)
+    return request.param
+
+def test_search_docs_counts_overlapping_tokens(tmp_path, search_backend):
+    (tmp_path / "a.md").write_text("one file\nfiles here\n")
+    results = DocEnhancer.search_docs("file files", str(tmp_path))
+    # "files" also contains "file", so that line matches both query words and ranks first.
+    assert results == [f"{tmp_path / 'a.md'}:2: files here", f"{tmp_path / 'a.md'}:1: one file"]
+    if search_backend == "hyperscan":
+        assert FakeHyperscanDatabase.scanned == [bytes]
+
+def test_cli_search(tmp_path):
+    (tmp_path / "a.md").write_text("## Function: parse_data\n")
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ["search", "--query", "parse data", "--docs-dir", str(tmp_path)])
+    assert result.exit_code == 0
+    assert "parse_data" in result.output
+
+def test_cli_enhance_local_workers(tmp_path):
+    with mock.patch.object(cli, "DocEnhancer") as enhancer_cls:
+        result = CliRunner().invoke(cli.cli, ["enhance", "--module", str(tmp_path / "m.py"), "--provider", "local",
+                                              "--model", "model.bin", "--local-workers", "4"])
+    assert result.exit_code == 0
+    assert enhancer_cls.call_args.kwargs["local_workers"] == 4
+
+def test_function_batch_rows():
+    batch = core.FunctionBatch()
+    batch.append({"name": "foo", "qualname": "Foo.foo", "source": "def foo(): pass", "docstring": "Doc",
+                  "summary": "Sum", "explanation": "Exp", "example": "", "example_test_result": None})
+    assert len(batch) == 1
+    assert batch.qualnames == ["Foo.foo"]
+    assert batch[0]["summary"] == "Sum"
+    assert [func["name"] for func in batch] == ["foo"]
+    batch.append({**batch[0], "name": "bar", "qualname": "bar"})
+    assert isinstance(batch[:1], core.FunctionBatch)
+    assert [func["name"] for func in batch[1:]] == ["bar"]
+    assert batch[-1]["name"] == "bar"
+
+def test_provider_client_loads_lazily(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(core, "_load_local_model", lambda model, threads=None: loaded.append(model) or (lambda prompt: "out"))
+    enhancer = DocEnhancer(provider="local", model="TheBloke/Llama-2-7B-GGML", cache=False)
+    assert loaded == []
+    assert enhancer._llm_local("prompt") == "out"
+    assert enhancer._llm_local("prompt") == "out"
+    assert loaded == ["TheBloke/Llama-2-7B-GGML"]
+    with pytest.raises(ValueError):
+        DocEnhancer(provider="anthropic", model="claude")
+
+def test_parse_module_runs_in_process_model_serially(tmp_path, monkeypatch):
+    import threading
+    loaded, active, overlaps = [], [], []
+    lock = threading.Lock()
+    def model(prompt):
+        with lock:
+            active.append(prompt)
+            overlaps.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(prompt)
+        return json.dumps({"translation": "Doc", "summary": "Sum", "explanation": "Exp", "example": ""})
+    monkeypatch.setattr(core, "_load_local_model", lambda model_name, threads=None: loaded.append(model_name) or model)
+    sample_file = tmp_path / "serial.py"
+    sample_file.write_text("".join(f"def f{i}():\n    return {i}\n\n" for i in range(8)))
+    enhancer = DocEnhancer(provider="local", model="model.bin", cache=False)
+    functions = enhancer.parse_module(str(sample_file))
+    assert len(functions) == 8
+    assert loaded == ["model.bin"]
+    assert max(overlaps) == 1
+
+def test_parse_module_runs_local_model_in_worker_pool(tmp_path, monkeypatch):
+    import functools
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # Fork so the patched loader below is what each worker's initializer calls.
+    monkeypatch.setattr(core, "ProcessPoolExecutor",
+                        functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("fork")))
+    def load(model, threads=None):
+        return lambda prompt: json.dumps({"translation": "Doc", "summary": str(os.getpid()),
+                                          "explanation": f"threads={threads}", "example": ""})
+    monkeypatch.setattr(core, "_load_local_model", load)
+    sample_file = tmp_path / "pooled.py"
+    sample_file.write_text("def first():\n    return 1\n\ndef second():\n    return 2\n")
+    enhancer = DocEnhancer(provider="local", model="model.bin", cache=False, local_workers=2)
+    functions = enhancer.parse_module(str(sample_file))
+    assert [f["name"] for f in functions] == ["first", "second"]
+    assert all(f["docstring"] == "Doc" for f in functions)
+    assert str(os.getpid()) not in {f["summary"] for f in functions}
+    assert functions[0]["explanation"] == f"threads={max(1, (os.cpu_count() or 1) // 2)}"
+
+def test_llm_prompt_templates(monkeypatch):
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    prompts = []
+    monkeypatch.setattr(enhancer, "_llm_ollama", lambda prompt, json_mode=False: prompts.append(prompt) or "ok")
+    enhancer._llm("def f(): return {}", "summarize", "fr")
+    enhancer._llm("raw {prompt}", "unknown")
+    assert prompts == ["Summarize the following Python code in fr:\ndef f(): return {}", "raw {prompt}"]
+
+def test_rate_limiter_spaces_requests():
+    limiter = core.RateLimiter(max_requests_per_minute=600, max_tokens_per_minute=10 ** 6)
+    async def burst():
+        start = time.monotonic()
+        for _ in range(601):
+            await limiter.acquire(10)
+        return time.monotonic() - start
+    # The bucket starts full, so only the 601st request waits for a refill (600/min = one per 0.1s).
+    assert asyncio.run(burst()) >= 0.09
+
+def test_llm_openai_streams_completion(tmp_path, monkeypatch):
+    from aiohttp import web
+    content = json.dumps({"translation": "Doc", "summary": "Streamed summary", "explanation": "Exp", "example": ""})
+    async def chat_completions(request):
+        assert (await request.json())["stream"] is True
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(0, len(content), 7):
+            chunk = {"choices": [{"delta": {"content": content[i:i + 7]}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+    async def run():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat_completions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(core, "OPENAI_URL", f"http://127.0.0.1:{port}/v1/chat/completions")
+        enhancer = DocEnhancer(provider="openai", model="gpt-4o-mini", api_key="test", cache=False)
+        sample_file = tmp_path / "openai.py"
+        sample_file.write_text("def foo():\n    return 1\n")
+        try:
+            records = enhancer._extract_functions(str(sample_file))
+            return [func async for func in enhancer._aiter_functions(records)]
+        finally:
+            await runner.cleanup()
+    functions = asyncio.run(run())
+    assert functions[0]["summary"] == "Streamed summary"
+
+def test_llm_openai_rate_limit_pauses_requests(tmp_path, monkeypatch):
+    from aiohttp import web
+    content = json.dumps({"translation": "Doc", "summary": "After retry", "explanation": "Exp", "example": ""})
+    arrivals = []
+    async def chat_completions(request):
+        arrivals.append(time.monotonic())
+        if len(arrivals) == 1:
+            return web.Response(status=429)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+    # The backoff alone waits one second, so a retry any sooner than the cooldown skipped the pause.
+    monkeypatch.setattr(core, "RATE_LIMIT_COOLDOWN", 1.5)
+    monkeypatch.setattr(core.random, "random", lambda: 0.0)
+    async def run():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat_completions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(core, "OPENAI_URL", f"http://127.0.0.1:{port}/v1/chat/completions")
+        enhancer = DocEnhancer(provider="openai", model="gpt-4o-mini", api_key="test", cache=False)
+        pauses = []
+        pause = enhancer._rate_limiter.pause
+        monkeypatch.setattr(enhancer._rate_limiter, "pause", lambda seconds: pauses.append(seconds) or pause(seconds))
+        sample_file = tmp_path / "limited.py"
+        sample_file.write_text("def foo():\n    return 1\n")
+        try:
+            records = enhancer._extract_functions(str(sample_file))
+            return [func async for func in enhancer._aiter_functions(records)], pauses
+        finally:
+            await runner.cleanup()
+    functions, pauses = asyncio.run(run())
+    assert functions[0]["summary"] == "After retry"
+    assert pauses == [1.5]
+    assert len(arrivals) == 2
+    assert arrivals[1] - arrivals[0] >= 1.5
+
+def test_llm_ollama_outlasts_session_timeout(monkeypatch):
+    from aiohttp import web
+    async def generate(request):
+        await asyncio.sleep(0.3)
+        return web.json_response({"response": "queued answer"})
+    async def run():
+        app = web.Application()
+        app.router.add_post("/api/generate", generate)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(core, "OLLAMA_URL", f"http://127.0.0.1:{port}/api/generate")
+        enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0.1)) as session:
+                return await enhancer._llm_ollama_async(session, asyncio.Semaphore(1), "prompt")
+        finally:
+            await runner.cleanup()
+    assert asyncio.run(run()) == "queued answer"
+
+def test_generate_docs_makes_one_llm_request_per_function(tmp_path, monkeypatch, fake_llm):
+    sample_file = tmp_path / "counted.py"
+    sample_file.write_text("def first():\n    return 1\n\ndef second():\n    return 2\n")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    calls = fake_llm(enhancer)
+    def fail_sync(*args, **kwargs):
+        raise AssertionError("generate_docs must reuse the parsed results")
+    monkeypatch.setattr(enhancer, "_llm", fail_sync)
+    enhancer.generate_docs(str(sample_file), str(tmp_path / "docs"))
+    assert len(calls) == 2
+
+def test_parse_module_finds_functions_in_statement_blocks(tmp_path):
+    sample_file = tmp_path / "blocks.py"
+    sample_file.write_text("""
+try:
+    import json
+    def dumps(obj):
+        return json.dumps(obj)
+except ImportError:
+    def dumps(obj):
+        return repr(obj)
+if True:
+    class Codec:
+        def encode(self):
+            return b""
+""")
+    enhancer = DocEnhancer(provider="local", model="ollama/llama3.2:latest", cache=False)
+    functions = enhancer.parse_module(str(sample_file))
+    assert [f["qualname"] for f in functions] == ["dumps", "dumps", "Codec.encode"]